@@ -11,18 +11,25 @@ from __future__ import annotations
 import csv
 import io
 import logging
+import logging.handlers
 import os
+import queue
 import re
+import threading
 import time
 import atexit
 from collections import defaultdict
 from pathlib import Path
 
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import Flask, flash, g, has_request_context, redirect, render_template, request, url_for
+from flask import session as flask_session
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event
+from sqlalchemy import bindparam, case, event, exists, insert, make_url, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.pool import Pool
 
 WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
 LEGACY_YEAR_GROUP_MAP = {
@@ -50,34 +57,104 @@ DAY_SHORT = {
     "Thursday": "Thu",
     "Friday": "Fri",
 }
+# Hashed lookups for validation; the ordered lists above stay the source for rendering.
+WEEK_DAY_SET = frozenset(WEEK_DAYS)
+GRID_CELL_KEYS = frozenset((day, slot, year_group) for day in WEEK_DAYS for slot in TEACHING_SLOTS for year_group in YEAR_GROUPS)
+WHITESPACE_RE = re.compile(r"\s+")
+MULTI_VALUE_SPLIT_RE = re.compile(r"[|;,]")
+DEFAULT_FREE_SLOTS = ", ".join(f"{DAY_SHORT[day]} {slot}" for day in WEEK_DAYS for slot in TEACHING_SLOTS)
 
 app = Flask(__name__)
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///teachers_app.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
-if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+# Raise on any lazy relationship load in the hot read paths instead of silently issuing per-row SELECTs.
+app.config["DEBUG_RAISELOAD"] = os.getenv("DEBUG_RAISELOAD", "0") == "1"
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "8"))
+# One pooled connection per server thread, so steady-state requests never open (and re-PRAGMA) a new one.
+# pysqlite already disables check_same_thread for file databases under QueuePool.
+DATABASE_URL = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+if DATABASE_URL.get_backend_name() == "sqlite":
     app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    # In-memory databases get a StaticPool, which takes no size.
+    if DATABASE_URL.database not in (None, "", ":memory:"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"] = WSGI_THREADS
+else:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": WSGI_THREADS, "pool_pre_ping": True}
 
 BAC_LOG = logging.getLogger("BAC_LOG")
 if not BAC_LOG.handlers:
     _handler = logging.StreamHandler()
     _handler.setFormatter(logging.Formatter("BAC_LOG | %(asctime)s | %(levelname)s | %(message)s"))
-    BAC_LOG.addHandler(_handler)
+    # Request threads only enqueue records; the listener thread owns the stream writes.
+    _log_queue = queue.SimpleQueue()
+    BAC_LOG.addHandler(logging.handlers.QueueHandler(_log_queue))
+    BAC_LOG_LISTENER = logging.handlers.QueueListener(_log_queue, _handler)
+    BAC_LOG_LISTENER.start()
+    atexit.register(BAC_LOG_LISTENER.stop)
 BAC_LOG.setLevel(logging.INFO)
 BAC_LOG.propagate = False
 
 db = SQLAlchemy(app)
 APP_LOCK_HANDLE = None
+# Bump whenever the models or the bootstrap migration/repair steps change so existing databases re-run them.
+BOOTSTRAP_SCHEMA_REV = 2
+# Bumped after every request that commits; rendered index pages are cached per version in this process.
+SCHEDULE_VERSION = 0
+SCHEDULE_VERSION_LOCK = threading.Lock()
+INDEX_HTML_CACHE: dict[tuple, str] = {}
+INDEX_HTML_CACHE_MAX_ENTRIES = 32
+# Well under SQLITE_MAX_VARIABLE_NUMBER, which is 999 on SQLite builds older than 3.32.
+SKILL_INSERT_BATCH_SIZE = 500
+# (script_root, active_day) -> built index URL for the redirect after every form post.
+INDEX_URL_CACHE: dict[tuple[str, str | None], str] = {}
+# teacher_id -> (free_slots text the mask was built from, SLOT_BIT mask)
+TEACHER_SLOT_MASK_CACHE: dict[int, tuple[str, int]] = {}
+# teacher_id -> skill ids; dropped after any commit that changes that teacher's teacher_skills rows.
+TEACHER_SKILL_IDS_CACHE: dict[int, frozenset[int]] = {}
+# index name -> present in sqlite_master; only ensure_grid_indexes creates them, so it resets this.
+SQLITE_INDEX_CACHE: dict[str, bool] = {}
 
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, _connection_record):
     module_name = dbapi_connection.__class__.__module__
     if module_name.startswith("sqlite3"):
+        # Let SQLAlchemy emit BEGIN itself (see begin_sqlite_transaction) instead of pysqlite's implicit deferred BEGIN.
+        dbapi_connection.isolation_level = None
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
         cursor.execute("PRAGMA busy_timeout=30000")
         cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA optimize=0x10002")
+        cursor.close()
+
+
+@event.listens_for(Engine, "begin")
+def begin_sqlite_transaction(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    # Writers take the write lock up front so concurrent requests queue on busy_timeout
+    # instead of failing with SQLITE_BUSY when a deferred read transaction tries to upgrade.
+    # Read-only probes outside a request opt out with execution_options(sqlite_read_only=True).
+    if conn.get_execution_options().get("sqlite_read_only") or (
+        has_request_context() and request.method in ("GET", "HEAD", "OPTIONS")
+    ):
+        conn.exec_driver_sql("BEGIN")
+    else:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+@event.listens_for(Pool, "close")
+def optimize_sqlite_on_close(dbapi_connection, _connection_record):
+    module_name = dbapi_connection.__class__.__module__
+    if module_name.startswith("sqlite3"):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA optimize")
         cursor.close()
 
 
@@ -95,8 +172,14 @@ class Teacher(db.Model):
     name = db.Column(db.String(120), nullable=False)
     free_slots = db.Column(db.Text, nullable=False, default="")
 
-    skills = db.relationship("Skill", secondary=teacher_skills, back_populates="teachers")
-    assigned_sessions = db.relationship("Session", back_populates="assigned_teacher", foreign_keys="Session.assigned_teacher_id")
+    skills = db.relationship("Skill", secondary=teacher_skills, back_populates="teachers", lazy="selectin")
+    # delete_teacher() nulls assignments itself (and the FK is ON DELETE SET NULL), so deletes need not load this.
+    assigned_sessions = db.relationship(
+        "Session",
+        back_populates="assigned_teacher",
+        foreign_keys="Session.assigned_teacher_id",
+        passive_deletes=True,
+    )
 
 
 class Skill(db.Model):
@@ -124,45 +207,43 @@ class Session(db.Model):
 
 
 def migrate_legacy_year_groups() -> None:
-    migrated = 0
-    for old_value, new_value in LEGACY_YEAR_GROUP_MAP.items():
-        migrated += Session.query.filter_by(year_group=old_value).update(
-            {Session.year_group: new_value},
-            synchronize_session=False,
-        )
+    # One UPDATE with a CASE lookup rewrites every legacy label in a single pass over sessions.
+    migrated = db.session.execute(
+        update(Session)
+        .where(Session.year_group.in_(list(LEGACY_YEAR_GROUP_MAP)))
+        .values(year_group=case(LEGACY_YEAR_GROUP_MAP, value=Session.year_group))
+        .execution_options(synchronize_session=False)
+    ).rowcount
     if migrated:
         db.session.commit()
         BAC_LOG.info("step=bootstrap.migration migrated_year_groups=%s", migrated)
 
 
 def deduplicate_grid_sessions() -> None:
-    by_cell: dict[tuple[str, str, str], list[Session]] = defaultdict(list)
-    by_teacher_slot: dict[tuple[str, str, int], list[Session]] = defaultdict(list)
-    removed = 0
-    unassigned_conflicts = 0
-
-    for session in grid_sessions_query().order_by(Session.id.asc()).all():
-        by_cell[(session.day, session.slot, session.year_group)].append(session)
-        if session.assigned_teacher_id:
-            by_teacher_slot[(session.day, session.slot, session.assigned_teacher_id)].append(session)
-
-    for sessions in by_cell.values():
-        if len(sessions) <= 1:
-            continue
-        keep = sessions[0]
-        for extra in sessions[1:]:
-            # Preserve a filled assignment if the kept row is empty.
-            if keep.assigned_teacher_id is None and extra.assigned_teacher_id is not None:
-                keep.assigned_teacher_id = extra.assigned_teacher_id
-            db.session.delete(extra)
-            removed += 1
-
-    for sessions in by_teacher_slot.values():
-        if len(sessions) <= 1:
-            continue
-        for extra in sessions[1:]:
-            extra.assigned_teacher_id = None
-            unassigned_conflicts += 1
+    # Keep one row per grid cell, preferring an assigned row and then the oldest one.
+    removed = db.session.execute(
+        text(
+            "DELETE FROM sessions WHERE id IN ("
+            "SELECT id FROM ("
+            "SELECT id, ROW_NUMBER() OVER ("
+            "PARTITION BY day, slot, year_group "
+            "ORDER BY CASE WHEN assigned_teacher_id IS NULL THEN 1 ELSE 0 END, id"
+            ") AS rn FROM sessions "
+            "WHERE day IS NOT NULL AND slot IS NOT NULL AND year_group IS NOT NULL"
+            ") WHERE rn > 1)"
+        )
+    ).rowcount
+    # A teacher can only hold one cell per (day, slot); unassign every later duplicate.
+    unassigned_conflicts = db.session.execute(
+        text(
+            "UPDATE sessions SET assigned_teacher_id = NULL WHERE id IN ("
+            "SELECT id FROM ("
+            "SELECT id, ROW_NUMBER() OVER (PARTITION BY day, slot, assigned_teacher_id ORDER BY id) AS rn "
+            "FROM sessions "
+            "WHERE assigned_teacher_id IS NOT NULL AND day IS NOT NULL AND slot IS NOT NULL"
+            ") WHERE rn > 1)"
+        )
+    ).rowcount
 
     if removed or unassigned_conflicts:
         db.session.commit()
@@ -173,33 +254,53 @@ def deduplicate_grid_sessions() -> None:
         )
 
 
-def ensure_grid_indexes() -> None:
+def sqlite_index_exists(name: str) -> bool:
+    found = SQLITE_INDEX_CACHE.get(name)
+    if found is None:
+        found = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {"name": name}
+        ).first() is not None
+        SQLITE_INDEX_CACHE[name] = found
+    return found
+
+
+def ensure_grid_indexes() -> bool:
     if db.engine.url.get_backend_name() != "sqlite":
-        return
+        return True
 
-    max_attempts = 6
-    for attempt in range(1, max_attempts + 1):
-        try:
-            with db.engine.begin() as conn:
-                conn.exec_driver_sql(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_sessions_grid_cell "
-                    "ON sessions(day, slot, year_group) "
-                    "WHERE day IS NOT NULL AND slot IS NOT NULL AND year_group IS NOT NULL"
-                )
-                conn.exec_driver_sql(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_sessions_teacher_slot "
-                    "ON sessions(day, slot, assigned_teacher_id) "
-                    "WHERE assigned_teacher_id IS NOT NULL AND day IS NOT NULL AND slot IS NOT NULL"
-                )
-            BAC_LOG.info("step=bootstrap.indexes_ready attempt=%s", attempt)
-            return
-        except OperationalError as exc:
-            is_locked = "database is locked" in str(exc).lower()
-            if not is_locked or attempt == max_attempts:
-                raise
-            wait_seconds = attempt * 0.5
-            BAC_LOG.warning("step=bootstrap.indexes_retry attempt=%s wait_seconds=%s reason=database_locked", attempt, wait_seconds)
-            time.sleep(wait_seconds)
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_sessions_grid_cell "
+            "ON sessions(day, slot, year_group) "
+            "WHERE day IS NOT NULL AND slot IS NOT NULL AND year_group IS NOT NULL"
+        )
+        # Also serves save_grid_session's busy-teacher probe: "assigned_teacher_id = ?" implies the
+        # partial predicate, so SQLite seeks on all three columns without a separate non-unique index.
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_sessions_teacher_slot "
+            "ON sessions(day, slot, assigned_teacher_id) "
+            "WHERE assigned_teacher_id IS NOT NULL AND day IS NOT NULL AND slot IS NOT NULL"
+        )
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_sessions_grid_cover "
+            "ON sessions(day, slot, year_group, assigned_teacher_id, required_skill_id)"
+        )
+        case_duplicate = conn.exec_driver_sql(
+            "SELECT lower(name) FROM skills GROUP BY lower(name) HAVING COUNT(*) > 1 LIMIT 1"
+        ).first()
+        all_created = not case_duplicate
+        if case_duplicate:
+            BAC_LOG.warning(
+                "step=bootstrap.index_skipped name=uq_skills_name_ci reason=case_insensitive_duplicates sample=%r",
+                case_duplicate[0],
+            )
+        else:
+            conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_skills_name_ci ON skills(lower(name))")
+        # Refresh planner statistics so the new indexes are actually considered.
+        conn.exec_driver_sql("PRAGMA optimize")
+    SQLITE_INDEX_CACHE.clear()
+    BAC_LOG.info("step=bootstrap.indexes_ready complete=%s", all_created)
+    return all_created
 
 
 def acquire_app_lock() -> bool:
@@ -255,7 +356,13 @@ atexit.register(release_app_lock)
 def run_bootstrap_step(step_name: str, fn, *, max_attempts: int = 8, skip_if_locked: bool = True) -> bool:
     for attempt in range(1, max_attempts + 1):
         try:
-            fn()
+            result = fn()
+            # Close out the step's session transaction so the next step's own connection is not blocked by it.
+            db.session.commit()
+            # A step returns False when it ran but left work undone; that must keep the bootstrap stamp unwritten.
+            if result is False:
+                BAC_LOG.warning("step=bootstrap.step_incomplete name=%s attempt=%s", step_name, attempt)
+                return False
             BAC_LOG.info("step=bootstrap.step_ok name=%s attempt=%s", step_name, attempt)
             return True
         except OperationalError as exc:
@@ -297,7 +404,7 @@ def split_csv(text: str) -> list[str]:
 
 
 def normalize(text: str) -> str:
-    return re.sub(r"\s+", " ", text.strip().lower())
+    return WHITESPACE_RE.sub(" ", text.strip().lower())
 
 
 def normalize_slot_csv(text: str) -> str:
@@ -305,20 +412,15 @@ def normalize_slot_csv(text: str) -> str:
 
 
 def parse_int_list(values: list[str]) -> list[int]:
-    parsed: list[int] = []
-    for value in values:
-        try:
-            parsed.append(int(value))
-        except (TypeError, ValueError):
-            continue
-    return parsed
+    # Ids are never negative, and every isdecimal() string is valid int() input, so no try/except is needed.
+    return [int(value) for value in values if value and value.isdecimal()]
 
 
 def split_multi_value_field(value: str) -> list[str]:
     text = (value or "").strip()
     if not text:
         return []
-    return [item.strip() for item in re.split(r"[|;,]", text) if item.strip()]
+    return [item.strip() for item in MULTI_VALUE_SPLIT_RE.split(text) if item.strip()]
 
 
 def decode_csv_upload(file_obj) -> tuple[str | None, str | None]:
@@ -346,18 +448,29 @@ def find_row_value(row: dict[str, str], candidates: list[str]) -> str:
     return ""
 
 
+def index_url(active_day: str | None = None) -> str:
+    # active_day is always one of WEEK_DAYS here, so the cache holds at most six URLs per mount point.
+    key = (request.script_root, active_day)
+    url = INDEX_URL_CACHE.get(key)
+    if url is None:
+        url = url_for("index", active_day=active_day)
+        INDEX_URL_CACHE[key] = url
+    return url
+
+
+def debug_load_options() -> list:
+    # Under DEBUG_RAISELOAD, any relationship a handler did not ask for up front raises instead of lazy-loading.
+    return [raiseload("*")] if app.config["DEBUG_RAISELOAD"] else []
+
+
 def parse_active_day(raw_value: str | None) -> str:
-    if raw_value in WEEK_DAYS:
+    if raw_value in WEEK_DAY_SET:
         return raw_value
     return WEEK_DAYS[0]
 
 
 def default_free_slots() -> str:
-    slots: list[str] = []
-    for day in WEEK_DAYS:
-        for slot in TEACHING_SLOTS:
-            slots.append(f"{DAY_SHORT[day]} {slot}")
-    return ", ".join(slots)
+    return DEFAULT_FREE_SLOTS
 
 
 def slot_aliases(day: str, slot: str) -> set[str]:
@@ -375,17 +488,93 @@ def slot_aliases(day: str, slot: str) -> set[str]:
     }
 
 
-def teacher_slot_tokens(teacher: Teacher) -> set[str]:
-    return {normalize(part) for part in split_multi_value_field(teacher.free_slots)}
+SLOT_ALIASES: dict[tuple[str, str], frozenset[str]] = {
+    (day, slot): frozenset(slot_aliases(day, slot)) for day in WEEK_DAYS for slot in TEACHING_SLOTS
+}
+
+
+# Each grid (day, slot) owns one bit; a teacher's free_slots text encodes to the OR of its slots' bits.
+SLOT_KEYS: tuple[tuple[str, str], ...] = tuple(SLOT_ALIASES)
+SLOT_BIT: dict[tuple[str, str], int] = {key: 1 << index for index, key in enumerate(SLOT_KEYS)}
+SLOT_TOKEN_BITS: dict[str, int] = {}
+for slot_key, aliases in SLOT_ALIASES.items():
+    for alias in aliases:
+        SLOT_TOKEN_BITS[alias] = SLOT_TOKEN_BITS.get(alias, 0) | SLOT_BIT[slot_key]
+
+
+def encode_slot_mask(free_slots: str) -> int:
+    mask = 0
+    for part in split_multi_value_field(free_slots):
+        mask |= SLOT_TOKEN_BITS.get(normalize(part), 0)
+    return mask
+
+
+def slot_mask_for(teacher_id: int | None, free_slots: str) -> int:
+    cached = TEACHER_SLOT_MASK_CACHE.get(teacher_id)
+    if cached and cached[0] == free_slots:
+        return cached[1]
+    mask = encode_slot_mask(free_slots)
+    if teacher_id is not None:
+        TEACHER_SLOT_MASK_CACHE[teacher_id] = (free_slots, mask)
+    return mask
+
+
+def teacher_slot_mask(teacher: Teacher) -> int:
+    return slot_mask_for(teacher.id, teacher.free_slots)
+
 
+def teacher_skill_ids(teacher_id: int) -> frozenset[int]:
+    cached = TEACHER_SKILL_IDS_CACHE.get(teacher_id)
+    if cached is None:
+        cached = frozenset(db.session.scalars(select(teacher_skills.c.skill_id).where(teacher_skills.c.teacher_id == teacher_id)))
+        TEACHER_SKILL_IDS_CACHE[teacher_id] = cached
+    return cached
 
-def teacher_is_available_for_slot(tokens: set[str], day: str, slot: str) -> bool:
-    aliases = slot_aliases(day, slot)
-    return any(token in aliases for token in tokens)
 
+def forget_teacher_caches(teacher_id: int) -> None:
+    TEACHER_SLOT_MASK_CACHE.pop(teacher_id, None)
+    TEACHER_SKILL_IDS_CACHE.pop(teacher_id, None)
 
-def grid_sessions_query():
-    return Session.query.filter(Session.day.in_(WEEK_DAYS), Session.slot.in_(TEACHING_SLOTS), Session.year_group.in_(YEAR_GROUPS))
+
+def teacher_is_available_for_slot(slot_mask: int, day: str, slot: str) -> bool:
+    return bool(slot_mask & SLOT_BIT[(day, slot)])
+
+
+def slot_availability_masks(teachers: list[Teacher]) -> dict[tuple[str, str], int]:
+    # Bit i of each mask is set when teachers[i] is free in that (day, slot).
+    masks = dict.fromkeys(SLOT_KEYS, 0)
+    for index, teacher in enumerate(teachers):
+        bit = 1 << index
+        for slot_index in iter_mask_bits(teacher_slot_mask(teacher)):
+            masks[SLOT_KEYS[slot_index]] |= bit
+    return masks
+
+
+def iter_mask_bits(mask: int):
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+# Select objects are immutable, so one statement built at import can back every caller.
+GRID_SESSIONS_SELECT = select(Session).where(
+    Session.day.in_(WEEK_DAYS),
+    Session.slot.in_(TEACHING_SLOTS),
+    Session.year_group.in_(YEAR_GROUPS),
+)
+
+
+def grid_sessions_select():
+    return GRID_SESSIONS_SELECT
+
+
+# The expanding bind keeps one cache key for every IN-list length, so the teacher forms never recompile it.
+SKILLS_BY_IDS_SELECT = select(Skill).where(Skill.id.in_(bindparam("skill_ids", expanding=True))).options(raiseload("*"))
+
+
+def skills_by_ids(skill_ids: list[int] | set[int]) -> list[Skill]:
+    return db.session.scalars(SKILLS_BY_IDS_SELECT, {"skill_ids": list(skill_ids)}).all()
 
 
 def get_or_create_grid_cell_session(day: str, slot: str, year_group: str, required_skill_id: int) -> tuple[Session, int]:
@@ -405,9 +594,71 @@ def get_or_create_grid_cell_session(day: str, slot: str, year_group: str, requir
     return primary, deduped
 
 
+def upsert_grid_cell_session(
+    day: str, slot: str, year_group: str, required_skill_id: int, assigned_teacher_id: int | None
+) -> tuple[int, int]:
+    # ensure_grid_indexes may have been skipped (database locked at startup), ON CONFLICT needs the index,
+    # and RETURNING needs SQLite 3.35+.
+    if (
+        db.engine.url.get_backend_name() == "sqlite"
+        and db.engine.dialect.insert_returning
+        and sqlite_index_exists("uq_sessions_grid_cell")
+    ):
+        # uq_sessions_grid_cell makes the cell save a single statement; duplicates cannot exist behind it.
+        stmt = (
+            sqlite_insert(Session)
+            .values(
+                day=day,
+                slot=slot,
+                year_group=year_group,
+                required_skill_id=required_skill_id,
+                assigned_teacher_id=assigned_teacher_id,
+            )
+            .on_conflict_do_update(
+                index_elements=[Session.day, Session.slot, Session.year_group],
+                index_where=Session.day.is_not(None) & Session.slot.is_not(None) & Session.year_group.is_not(None),
+                set_={"required_skill_id": required_skill_id, "assigned_teacher_id": assigned_teacher_id},
+            )
+            .returning(Session.id)
+        )
+        return db.session.scalar(stmt), 0
+
+    session, deduped = get_or_create_grid_cell_session(day, slot, year_group, required_skill_id)
+    session.required_skill_id = required_skill_id
+    session.assigned_teacher_id = assigned_teacher_id
+    db.session.flush()
+    return session.id, deduped
+
+
+def insert_missing_skills(names: list[str]) -> set[str]:
+    if not names:
+        return set()
+
+    # uq_skills_name_ci is skipped on databases that already hold case variants, and RETURNING needs
+    # SQLite 3.35+; with both in place the index drops existing names without reading the skills table.
+    if (
+        db.engine.url.get_backend_name() == "sqlite"
+        and db.engine.dialect.insert_returning
+        and sqlite_index_exists("uq_skills_name_ci")
+    ):
+        inserted: set[str] = set()
+        # One bound variable per row; batching keeps large CSVs under SQLite's variable limit.
+        for start in range(0, len(names), SKILL_INSERT_BATCH_SIZE):
+            batch = names[start:start + SKILL_INSERT_BATCH_SIZE]
+            stmt = sqlite_insert(Skill).values([{"name": name} for name in batch]).on_conflict_do_nothing().returning(Skill.name)
+            inserted.update(db.session.scalars(stmt))
+        return inserted
+
+    existing = {normalize(name) for (name,) in db.session.query(Skill.name)}
+    fresh = [name for name in names if normalize(name) not in existing]
+    if fresh:
+        db.session.bulk_insert_mappings(Skill, [{"name": name} for name in fresh])
+    return set(fresh)
+
+
 def allocate_sessions() -> None:
-    teacher_rows = Teacher.query.order_by(Teacher.name.asc()).all()
-    session_rows = grid_sessions_query().all()
+    teacher_rows = Teacher.query.options(selectinload(Teacher.skills)).order_by(Teacher.name.asc()).all()
+    session_rows = db.session.scalars(grid_sessions_select()).all()
     BAC_LOG.info("step=allocate.start teachers=%s sessions=%s", len(teacher_rows), len(session_rows))
 
     day_order = {day: idx for idx, day in enumerate(WEEK_DAYS)}
@@ -415,63 +666,83 @@ def allocate_sessions() -> None:
     year_order = {year: idx for idx, year in enumerate(YEAR_GROUPS)}
     session_rows.sort(key=lambda item: (day_order[item.day], slot_order[item.slot], year_order[item.year_group]))
 
-    teacher_tokens = {teacher.id: teacher_slot_tokens(teacher) for teacher in teacher_rows}
-    teacher_skill_ids = {teacher.id: {skill.id for skill in teacher.skills} for teacher in teacher_rows}
-    busy_at_slot: dict[tuple[str, str], set[int]] = defaultdict(set)
-    assigned_count: dict[int, int] = {teacher.id: 0 for teacher in teacher_rows}
-
-    for session in session_rows:
-        session.assigned_teacher_id = None
-
+    available_mask = slot_availability_masks(teacher_rows)
+    skill_mask: dict[int, int] = defaultdict(int)
+    for index, teacher in enumerate(teacher_rows):
+        for skill in teacher.skills:
+            skill_mask[skill.id] |= 1 << index
+    busy_mask: dict[tuple[str, str], int] = defaultdict(int)
+    assigned_count = [0] * len(teacher_rows)
+    name_keys = [teacher.name.lower() for teacher in teacher_rows]
+
+    updates: list[dict[str, int]] = []
+    log_rows = BAC_LOG.isEnabledFor(logging.DEBUG)
     assigned = 0
     unassigned = 0
 
     for session in session_rows:
-        matches: list[Teacher] = []
-        for teacher in teacher_rows:
-            if session.required_skill_id not in teacher_skill_ids.get(teacher.id, set()):
-                continue
-            if not teacher_is_available_for_slot(teacher_tokens.get(teacher.id, set()), session.day, session.slot):
-                continue
-            if teacher.id in busy_at_slot[(session.day, session.slot)]:
-                continue
-            matches.append(teacher)
+        slot_key = (session.day, session.slot)
+        candidates = skill_mask.get(session.required_skill_id, 0) & available_mask[slot_key] & ~busy_mask[slot_key]
 
-        if not matches:
+        if not candidates:
             unassigned += 1
-            BAC_LOG.info(
-                "step=allocate.unassigned session_id=%s day=%s slot=%s year_group=%s",
+            if log_rows:
+                BAC_LOG.debug(
+                    "step=allocate.unassigned session_id=%s day=%s slot=%s year_group=%s",
+                    session.id,
+                    session.day,
+                    session.slot,
+                    session.year_group,
+                )
+            continue
+
+        # Least-loaded teacher first, then by name; min() keeps the first (lowest index) on full ties.
+        selected_index = min(iter_mask_bits(candidates), key=lambda index: (assigned_count[index], name_keys[index]))
+        selected = teacher_rows[selected_index]
+        updates.append({"id": session.id, "assigned_teacher_id": selected.id})
+        busy_mask[slot_key] |= 1 << selected_index
+        assigned_count[selected_index] += 1
+        assigned += 1
+        if log_rows:
+            BAC_LOG.debug(
+                "step=allocate.assigned session_id=%s teacher_id=%s day=%s slot=%s year_group=%s",
                 session.id,
+                selected.id,
                 session.day,
                 session.slot,
                 session.year_group,
             )
-            continue
-
-        matches.sort(key=lambda teacher: (assigned_count[teacher.id], teacher.name.lower()))
-        selected = matches[0]
-        session.assigned_teacher_id = selected.id
-        busy_at_slot[(session.day, session.slot)].add(selected.id)
-        assigned_count[selected.id] += 1
-        assigned += 1
-        BAC_LOG.info(
-            "step=allocate.assigned session_id=%s teacher_id=%s day=%s slot=%s year_group=%s",
-            session.id,
-            selected.id,
-            session.day,
-            session.slot,
-            session.year_group,
-        )
 
+    # Clear every grid cell with one UPDATE, then write the whole plan in a single executemany.
+    db.session.execute(
+        update(Session)
+        .where(grid_sessions_select().whereclause)
+        .values(assigned_teacher_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    if updates:
+        db.session.bulk_update_mappings(Session, updates)
     db.session.commit()
     BAC_LOG.info("step=allocate.complete assigned=%s unassigned=%s", assigned, unassigned)
 
 
+def build_teacher_choices(teachers: list[Teacher]) -> list[dict]:
+    # Shared by every grid cell; per-cell state lives in the id sets built by build_schedule.
+    return [
+        {
+            "id": teacher.id,
+            "name": teacher.name,
+            "skills": ", ".join(skill.name for skill in teacher.skills) or "No skills",
+        }
+        for teacher in teachers
+    ]
+
+
 def build_schedule(teachers: list[Teacher], sessions: list[Session]) -> dict[str, list[dict]]:
     schedule_sessions = [
         session
         for session in sessions
-        if session.day in WEEK_DAYS and session.slot in TEACHING_SLOTS and session.year_group in YEAR_GROUPS
+        if (session.day, session.slot, session.year_group) in GRID_CELL_KEYS
     ]
     session_lookup = {(session.day, session.slot, session.year_group): session for session in schedule_sessions}
 
@@ -480,8 +751,13 @@ def build_schedule(teachers: list[Teacher], sessions: list[Session]) -> dict[str
         if session.assigned_teacher_id:
             busy_at_slot[(session.day, session.slot)].add(session.assigned_teacher_id)
 
-    teacher_tokens = {teacher.id: teacher_slot_tokens(teacher) for teacher in teachers}
-    teacher_skill_ids = {teacher.id: {skill.id for skill in teacher.skills} for teacher in teachers}
+    available_mask = slot_availability_masks(teachers)
+    all_teachers_mask = (1 << len(teachers)) - 1
+    skilled_teacher_ids: dict[int, set[int]] = defaultdict(set)
+    for teacher in teachers:
+        for skill in teacher.skills:
+            skilled_teacher_ids[skill.id].add(teacher.id)
+    no_teacher_ids: frozenset[int] = frozenset()
 
     schedule: dict[str, list[dict]] = {}
     for day in WEEK_DAYS:
@@ -492,34 +768,17 @@ def build_schedule(teachers: list[Teacher], sessions: list[Session]) -> dict[str
                 day_rows.append({"is_lunch": True, "slot": slot, "cells": []})
                 continue
 
+            # Computed once per (day, slot) and shared by every year group in the row.
+            unavailable_mask = all_teachers_mask & ~available_mask[(day, slot)]
+            unavailable_ids = frozenset(teachers[index].id for index in iter_mask_bits(unavailable_mask))
+            busy_ids = frozenset(busy_at_slot[(day, slot)])
+
             cells: list[dict] = []
             for year_group in YEAR_GROUPS:
                 existing = session_lookup.get((day, slot, year_group))
                 current_teacher_id = existing.assigned_teacher_id if existing else None
                 required_skill_id = existing.required_skill_id if existing else None
 
-                teacher_options = []
-                for teacher in teachers:
-                    available = teacher_is_available_for_slot(teacher_tokens[teacher.id], day, slot)
-                    busy_elsewhere = teacher.id in busy_at_slot[(day, slot)] and teacher.id != current_teacher_id
-                    has_skill = True
-                    if required_skill_id:
-                        has_skill = required_skill_id in teacher_skill_ids.get(teacher.id, set())
-                    selectable = available and (not busy_elsewhere) and has_skill
-
-                    teacher_options.append(
-                        {
-                            "id": teacher.id,
-                            "name": teacher.name,
-                            "skills": ", ".join(skill.name for skill in teacher.skills) or "No skills",
-                            "selected": teacher.id == current_teacher_id,
-                            "available": available,
-                            "busy": busy_elsewhere,
-                            "has_skill": has_skill,
-                            "selectable": selectable,
-                        }
-                    )
-
                 cells.append(
                     {
                         "year_group": year_group,
@@ -529,7 +788,11 @@ def build_schedule(teachers: list[Teacher], sessions: list[Session]) -> dict[str
                         "required_skill_id": required_skill_id,
                         "assigned_teacher_id": current_teacher_id,
                         "assigned_teacher_name": existing.assigned_teacher.name if existing and existing.assigned_teacher else None,
-                        "teacher_options": teacher_options,
+                        # busy_ids includes the cell's own teacher; the template only treats other cells' teachers as busy.
+                        "busy_ids": busy_ids,
+                        "unavailable_ids": unavailable_ids,
+                        # None means no skill is required yet, so every teacher qualifies.
+                        "skilled_ids": skilled_teacher_ids.get(required_skill_id, no_teacher_ids) if required_skill_id else None,
                     }
                 )
 
@@ -540,15 +803,52 @@ def build_schedule(teachers: list[Teacher], sessions: list[Session]) -> dict[str
     return schedule
 
 
+@event.listens_for(db.session, "after_commit")
+def mark_schedule_changed(_session):
+    # Only requests that actually commit invalidate the cached pages; rejected posts and no-op saves never commit.
+    if has_request_context():
+        g.schedule_changed = True
+
+
+@app.after_request
+def bump_schedule_version(response):
+    global SCHEDULE_VERSION
+    if g.pop("schedule_changed", False):
+        with SCHEDULE_VERSION_LOCK:
+            SCHEDULE_VERSION += 1
+            INDEX_HTML_CACHE.clear()
+    return response
+
+
 @app.get("/")
 def index():
     active_day = parse_active_day(request.args.get("active_day"))
     edit_teacher_id = request.args.get("edit_teacher_id", type=int)
     edit_skill_id = request.args.get("edit_skill_id", type=int)
 
-    teachers = Teacher.query.order_by(Teacher.name.asc()).all()
+    # Pages carrying flash messages are one-off renders and must not be served again from cache.
+    cacheable = not flask_session.get("_flashes")
+    cache_key = (SCHEDULE_VERSION, active_day, edit_teacher_id, edit_skill_id)
+    if cacheable:
+        cached_html = INDEX_HTML_CACHE.get(cache_key)
+        if cached_html is not None:
+            BAC_LOG.info("step=index.cache_hit version=%s active_day=%s", cache_key[0], active_day)
+            return cached_html
+
+    teacher_load_options = [selectinload(Teacher.skills)]
+    # Assigned teachers are already in the identity map with skills loaded by the teacher query above.
+    session_load_options = [joinedload(Session.assigned_teacher).lazyload(Teacher.skills), joinedload(Session.required_skill)]
+    if app.config["DEBUG_RAISELOAD"]:
+        teacher_load_options.append(raiseload("*"))
+        session_load_options = [
+            joinedload(Session.assigned_teacher).joinedload(Teacher.skills),
+            joinedload(Session.required_skill),
+            raiseload("*"),
+        ]
+
+    teachers = Teacher.query.options(*teacher_load_options).order_by(Teacher.name.asc()).all()
     skills = Skill.query.order_by(Skill.name.asc()).all()
-    sessions = Session.query.order_by(Session.id.asc()).all()
+    sessions = Session.query.options(*session_load_options).order_by(Session.id.asc()).all()
 
     edit_teacher = db.session.get(Teacher, edit_teacher_id) if edit_teacher_id else None
     edit_skill = db.session.get(Skill, edit_skill_id) if edit_skill_id else None
@@ -557,7 +857,7 @@ def index():
     unassigned_count = sum(
         1
         for session in sessions
-        if session.day in WEEK_DAYS and session.slot in TEACHING_SLOTS and session.year_group in YEAR_GROUPS and session.assigned_teacher_id is None
+        if session.assigned_teacher_id is None and (session.day, session.slot, session.year_group) in GRID_CELL_KEYS
     )
 
     BAC_LOG.info(
@@ -568,7 +868,7 @@ def index():
         active_day,
     )
 
-    return render_template(
+    html = render_template(
         "index.html",
         teachers=teachers,
         skills=skills,
@@ -578,9 +878,15 @@ def index():
         week_days=WEEK_DAYS,
         year_groups=YEAR_GROUPS,
         schedule=schedule,
+        teacher_choices=build_teacher_choices(teachers),
         active_day=active_day,
         unassigned_count=unassigned_count,
     )
+    if cacheable:
+        if len(INDEX_HTML_CACHE) >= INDEX_HTML_CACHE_MAX_ENTRIES:
+            INDEX_HTML_CACHE.clear()
+        INDEX_HTML_CACHE[cache_key] = html
+    return html
 
 
 @app.post("/import/skills")
@@ -592,15 +898,19 @@ def import_skills_csv():
     if error:
         BAC_LOG.warning("step=skills.import.validation_failed reason=%s", error)
         flash(error, "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     reader = csv.DictReader(io.StringIO(text))
     if not reader.fieldnames:
         BAC_LOG.warning("step=skills.import.validation_failed reason=missing_header")
         flash("Skills CSV must contain headers.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
-    existing = {normalize(skill.name): skill for skill in Skill.query.all()}
+    seen_keys: set[str] = set()
+    # (line_no, name) in file order; name is None for a row without one, and duplicate in-file names are kept
+    # so the per-row log lines can be written in line order once the insert outcome is known.
+    row_names: list[tuple[int, str | None]] = []
+    candidates: list[str] = []
     inserted_count = 0
     skipped_count = 0
 
@@ -608,34 +918,41 @@ def import_skills_csv():
         name_field = find_row_value(row, ["name", "skill", "skill_name"])
         names = split_multi_value_field(name_field)
         if not names:
-            skipped_count += 1
-            BAC_LOG.warning("step=skills.import.row_skipped line=%s reason=missing_name", line_no)
+            row_names.append((line_no, None))
             continue
 
         for name in names:
+            row_names.append((line_no, name))
             key = normalize(name)
-            if key in existing:
-                skipped_count += 1
-                BAC_LOG.info("step=skills.import.row_skipped line=%s reason=duplicate name=%r", line_no, name)
-                continue
-
-            skill = Skill(name=name)
-            db.session.add(skill)
-            existing[key] = skill
-            inserted_count += 1
-            BAC_LOG.info("step=skills.import.row_added line=%s name=%r", line_no, name)
+            if key not in seen_keys:
+                seen_keys.add(key)
+                candidates.append(name)
 
     try:
+        inserted_names = insert_missing_skills(candidates)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         BAC_LOG.warning("step=skills.import.failed reason=integrity_error")
         flash("Skills import failed due to duplicate values.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
+
+    for line_no, name in row_names:
+        if name is None:
+            skipped_count += 1
+            BAC_LOG.warning("step=skills.import.row_skipped line=%s reason=missing_name", line_no)
+        elif name in inserted_names:
+            # Discard so a later identical spelling in the file is reported as a duplicate.
+            inserted_names.discard(name)
+            inserted_count += 1
+            BAC_LOG.info("step=skills.import.row_added line=%s name=%r", line_no, name)
+        else:
+            skipped_count += 1
+            BAC_LOG.info("step=skills.import.row_skipped line=%s reason=duplicate name=%r", line_no, name)
 
     BAC_LOG.info("step=skills.import.complete inserted=%s skipped=%s", inserted_count, skipped_count)
     flash(f"Skills import complete. Added {inserted_count}, skipped {skipped_count}.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/import/teachers")
@@ -647,15 +964,18 @@ def import_teachers_csv():
     if error:
         BAC_LOG.warning("step=teachers.import.validation_failed reason=%s", error)
         flash(error, "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     reader = csv.DictReader(io.StringIO(text))
     if not reader.fieldnames:
         BAC_LOG.warning("step=teachers.import.validation_failed reason=missing_header")
         flash("Teachers CSV must contain headers.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
-    skill_map = {normalize(skill.name): skill for skill in Skill.query.all()}
+    known_skill_keys = {normalize(name) for (name,) in db.session.query(Skill.name)}
+    new_skills: list[dict[str, str]] = []
+    new_teachers: list[dict[str, str]] = []
+    teacher_skill_keys: list[list[str]] = []
     inserted_teachers = 0
     auto_created_skills = 0
     skipped_rows = 0
@@ -679,35 +999,53 @@ def import_teachers_csv():
             defaulted_slot_rows += 1
             BAC_LOG.info("step=teachers.import.row_defaulted_slots line=%s teacher_name=%r", line_no, name)
 
-        teacher = Teacher(name=name, free_slots=free_slots_value)
-
-        seen_skill_keys: set[str] = set()
+        row_skill_keys: list[str] = []
         for skill_name in skill_names:
             key = normalize(skill_name)
-            if key in seen_skill_keys:
+            if key in row_skill_keys:
                 BAC_LOG.info("step=teachers.import.row_skipped line=%s reason=duplicate_skill_in_row name=%r", line_no, skill_name)
                 continue
-            seen_skill_keys.add(key)
-            skill = skill_map.get(key)
-            if skill is None:
-                skill = Skill(name=skill_name)
-                db.session.add(skill)
-                skill_map[key] = skill
+            row_skill_keys.append(key)
+            if key not in known_skill_keys:
+                new_skills.append({"name": skill_name})
+                known_skill_keys.add(key)
                 auto_created_skills += 1
                 BAC_LOG.info("step=teachers.import.skill_auto_created line=%s name=%r", line_no, skill_name)
-            teacher.skills.append(skill)
 
-        db.session.add(teacher)
+        new_teachers.append({"name": name, "free_slots": free_slots_value})
+        teacher_skill_keys.append(row_skill_keys)
         inserted_teachers += 1
         BAC_LOG.info("step=teachers.import.row_added line=%s teacher_name=%r", line_no, name)
 
     try:
+        if new_skills:
+            db.session.bulk_insert_mappings(Skill, new_skills)
+        if new_teachers:
+            skill_ids = {normalize(name): skill_id for skill_id, name in db.session.query(Skill.id, Skill.name)}
+            # RETURNING needs SQLite 3.35+; older builds flush the teachers through the ORM to learn their ids.
+            if db.engine.dialect.insert_returning:
+                teacher_ids = db.session.scalars(
+                    insert(Teacher).returning(Teacher.id, sort_by_parameter_order=True),
+                    new_teachers,
+                ).all()
+            else:
+                teachers = [Teacher(**row) for row in new_teachers]
+                db.session.add_all(teachers)
+                db.session.flush()
+                teacher_ids = [teacher.id for teacher in teachers]
+            assoc_rows = [
+                {"teacher_id": teacher_id, "skill_id": skill_ids[key]}
+                for teacher_id, keys in zip(teacher_ids, teacher_skill_keys)
+                for key in keys
+            ]
+            if assoc_rows:
+                db.session.execute(teacher_skills.insert(), assoc_rows)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         BAC_LOG.warning("step=teachers.import.failed reason=integrity_error")
         flash("Teacher import failed due to duplicate values.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     BAC_LOG.info(
         "step=teachers.import.complete inserted_teachers=%s auto_created_skills=%s skipped_rows=%s defaulted_slot_rows=%s",
@@ -726,7 +1064,7 @@ def import_teachers_csv():
         ),
         "success",
     )
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/skills")
@@ -736,7 +1074,7 @@ def create_skill():
     if not name:
         BAC_LOG.warning("step=skills.create.validation_failed reason=missing_name")
         flash("Skill name is required.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     db.session.add(Skill(name=name))
     try:
@@ -748,7 +1086,7 @@ def create_skill():
         BAC_LOG.warning("step=skills.create.failed reason=duplicate_name name=%r", name)
         flash("Skill name must be unique.", "error")
 
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/skills/<int:skill_id>/update")
@@ -773,7 +1111,7 @@ def update_skill(skill_id: int):
         flash("Skill name must be unique.", "error")
         return redirect(url_for("index", edit_skill_id=skill.id))
 
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/skills/<int:skill_id>/delete")
@@ -781,16 +1119,19 @@ def delete_skill(skill_id: int):
     skill = db.get_or_404(Skill, skill_id)
     BAC_LOG.info("step=skills.delete.request skill_id=%s", skill_id)
 
-    if skill.required_sessions:
+    in_use = db.session.scalar(select(exists().where(Session.required_skill_id == skill.id)))
+    if in_use:
         BAC_LOG.warning("step=skills.delete.blocked skill_id=%s reason=in_use_by_sessions", skill_id)
         flash("Cannot delete a skill that is used by sessions.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     db.session.delete(skill)
     db.session.commit()
+    # The delete cascades through teacher_skills, and SQLite may hand the freed id to a new skill.
+    TEACHER_SKILL_IDS_CACHE.clear()
     BAC_LOG.info("step=skills.delete.success skill_id=%s", skill_id)
     flash("Skill deleted.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/teachers")
@@ -804,55 +1145,79 @@ def create_teacher():
     if not name:
         BAC_LOG.warning("step=teachers.create.validation_failed reason=missing_name")
         flash("Teacher name is required.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     teacher = Teacher(name=name, free_slots=free_slots)
     if skill_ids:
-        teacher.skills = Skill.query.filter(Skill.id.in_(skill_ids)).all()
+        teacher.skills = skills_by_ids(skill_ids)
 
     db.session.add(teacher)
     db.session.commit()
+    forget_teacher_caches(teacher.id)
     BAC_LOG.info("step=teachers.create.success teacher_id=%s", teacher.id)
     flash("Teacher created.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/teachers/<int:teacher_id>/update")
 def update_teacher(teacher_id: int):
-    teacher = db.get_or_404(Teacher, teacher_id)
+    teacher = db.one_or_404(
+        select(Teacher).where(Teacher.id == teacher_id).options(selectinload(Teacher.skills), *debug_load_options())
+    )
     name = request.form.get("name", "").strip()
     free_slots_raw = request.form.get("free_slots")
-    if free_slots_raw is None or not free_slots_raw.strip():
-        free_slots = teacher.free_slots or default_free_slots()
-    else:
+    has_free_slots_input = bool(free_slots_raw and free_slots_raw.strip())
+    if has_free_slots_input:
         free_slots = normalize_slot_csv(free_slots_raw)
+    else:
+        free_slots = teacher.free_slots or default_free_slots()
     skill_ids = parse_int_list(request.form.getlist("skill_ids"))
-    BAC_LOG.info("step=teachers.update.request teacher_id=%s name=%r skill_ids=%s has_free_slots_input=%s", teacher_id, name, skill_ids, bool(free_slots_raw and free_slots_raw.strip()))
+    BAC_LOG.info("step=teachers.update.request teacher_id=%s name=%r skill_ids=%s has_free_slots_input=%s", teacher_id, name, skill_ids, has_free_slots_input)
 
     if not name:
         BAC_LOG.warning("step=teachers.update.validation_failed teacher_id=%s reason=missing_name", teacher_id)
         flash("Teacher name is required.", "error")
         return redirect(url_for("index", edit_teacher_id=teacher.id))
 
-    teacher.name = name
-    teacher.free_slots = free_slots
-    teacher.skills = Skill.query.filter(Skill.id.in_(skill_ids)).all() if skill_ids else []
+    current_skill_ids = {skill.id for skill in teacher.skills}
+    requested_skill_ids = set(skill_ids)
+    skill_ids_to_add = requested_skill_ids - current_skill_ids
+    skill_ids_to_remove = current_skill_ids - requested_skill_ids
+    if not skill_ids_to_add and not skill_ids_to_remove and teacher.name == name and teacher.free_slots == free_slots:
+        BAC_LOG.info("step=teachers.update.unchanged teacher_id=%s", teacher_id)
+        flash("Teacher updated.", "success")
+        return redirect(index_url())
+
+    # no_autoflush keeps the skills SELECT from flushing the half-applied edit; commit flushes it all once.
+    with db.session.no_autoflush:
+        teacher.name = name
+        teacher.free_slots = free_slots
+        # Only touch the association rows that actually change.
+        for skill in [skill for skill in teacher.skills if skill.id in skill_ids_to_remove]:
+            teacher.skills.remove(skill)
+        if skill_ids_to_add:
+            teacher.skills.extend(skills_by_ids(skill_ids_to_add))
     db.session.commit()
+    forget_teacher_caches(teacher_id)
     BAC_LOG.info("step=teachers.update.success teacher_id=%s", teacher_id)
     flash("Teacher updated.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/teachers/<int:teacher_id>/delete")
 def delete_teacher(teacher_id: int):
-    teacher = db.get_or_404(Teacher, teacher_id)
+    # The teacher_skills rows are removed through the loaded skills collection.
+    teacher = db.one_or_404(
+        select(Teacher).where(Teacher.id == teacher_id).options(selectinload(Teacher.skills), *debug_load_options())
+    )
     BAC_LOG.info("step=teachers.delete.request teacher_id=%s", teacher_id)
-    Session.query.filter_by(assigned_teacher_id=teacher.id).update({Session.assigned_teacher_id: None})
+    Session.query.filter_by(assigned_teacher_id=teacher.id).update({Session.assigned_teacher_id: None}, synchronize_session=False)
     db.session.delete(teacher)
     db.session.commit()
+    forget_teacher_caches(teacher_id)
     BAC_LOG.info("step=teachers.delete.success teacher_id=%s", teacher_id)
     flash("Teacher deleted.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
 
 
 @app.post("/sessions/grid/save")
@@ -873,60 +1238,84 @@ def save_grid_session():
         assigned_teacher_id,
     )
 
-    if day not in WEEK_DAYS or slot not in TEACHING_SLOTS or year_group not in YEAR_GROUPS:
+    if (day, slot, year_group) not in GRID_CELL_KEYS:
         BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=invalid_grid_coordinates")
         flash("Invalid day/slot/year cell.", "error")
-        return redirect(url_for("index", active_day=active_day))
+        return redirect(index_url(active_day))
+
+    # Re-posting a cell's current (skill, teacher) pair changes nothing, so skip the write. The teacher's
+    # availability and skill are re-checked from the per-teacher caches, because either may have been edited
+    # since the cell was saved; a stale cell falls through to the full validation below and reports why.
+    # A duplicated cell always takes the full path so the repair still runs.
+    cell_rows = db.session.execute(
+        select(Session.required_skill_id, Session.assigned_teacher_id, Teacher.free_slots)
+        .outerjoin(Teacher, Session.assigned_teacher_id == Teacher.id)
+        .where(
+            Session.day == day,
+            Session.slot == slot,
+            Session.year_group == year_group,
+        )
+    ).all()
+    if len(cell_rows) == 1:
+        cell_skill_id, cell_teacher_id, cell_free_slots = cell_rows[0]
+        unchanged = (cell_skill_id, cell_teacher_id) == (required_skill_id, assigned_teacher_id or None)
+        still_valid = cell_teacher_id is None or (
+            teacher_is_available_for_slot(slot_mask_for(cell_teacher_id, cell_free_slots), day, slot)
+            and cell_skill_id in teacher_skill_ids(cell_teacher_id)
+        )
+        if unchanged and still_valid:
+            BAC_LOG.info("step=sessions.grid.save.noop day=%s slot=%s year_group=%s", day, slot, year_group)
+            flash("No changes to save.", "success")
+            return redirect(index_url(active_day))
 
-    skill = db.session.get(Skill, required_skill_id) if required_skill_id else None
+    skill = db.session.get(Skill, required_skill_id, options=debug_load_options()) if required_skill_id else None
     if not skill:
         BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=missing_skill")
         flash("Select a required skill for this cell.", "error")
-        return redirect(url_for("index", active_day=active_day))
-
-    session, deduped_cells = get_or_create_grid_cell_session(day, slot, year_group, skill.id)
-    if deduped_cells:
-        BAC_LOG.warning("step=sessions.grid.save.deduped_cells count=%s day=%s slot=%s year_group=%s", deduped_cells, day, slot, year_group)
-    session.required_skill_id = skill.id
+        return redirect(index_url(active_day))
 
     if assigned_teacher_id:
-        teacher = db.session.get(Teacher, assigned_teacher_id)
+        teacher = db.session.get(Teacher, assigned_teacher_id, options=[raiseload(Teacher.skills), *debug_load_options()])
         if not teacher:
             BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=teacher_not_found")
             flash("Selected teacher does not exist.", "error")
-            return redirect(url_for("index", active_day=active_day))
+            return redirect(index_url(active_day))
 
-        tokens = teacher_slot_tokens(teacher)
-        if not teacher_is_available_for_slot(tokens, day, slot):
+        if not teacher_is_available_for_slot(teacher_slot_mask(teacher), day, slot):
             BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=teacher_not_available teacher_id=%s", teacher.id)
             flash("Selected teacher is not free in this time slot.", "error")
-            return redirect(url_for("index", active_day=active_day))
+            return redirect(index_url(active_day))
 
-        teacher_skill_ids = {item.id for item in teacher.skills}
-        if skill.id not in teacher_skill_ids:
+        if skill.id not in teacher_skill_ids(teacher.id):
             BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=teacher_missing_skill teacher_id=%s", teacher.id)
             flash("Selected teacher does not have the selected skill.", "error")
-            return redirect(url_for("index", active_day=active_day))
-
-        conflict = Session.query.filter(
-            Session.day == day,
-            Session.slot == slot,
-            Session.assigned_teacher_id == teacher.id,
-            Session.id != session.id,
-        ).first()
+            return redirect(index_url(active_day))
+
+        conflict = db.session.scalar(
+            select(
+                exists().where(
+                    Session.day == day,
+                    Session.slot == slot,
+                    Session.assigned_teacher_id == teacher.id,
+                    Session.year_group.is_distinct_from(year_group),
+                )
+            )
+        )
         if conflict:
             BAC_LOG.warning("step=sessions.grid.save.validation_failed reason=teacher_busy teacher_id=%s", teacher.id)
             flash("Selected teacher is already allocated in this period.", "error")
-            return redirect(url_for("index", active_day=active_day))
-
-        session.assigned_teacher_id = teacher.id
+            return redirect(index_url(active_day))
     else:
-        session.assigned_teacher_id = None
+        assigned_teacher_id = None
+
+    session_id, deduped_cells = upsert_grid_cell_session(day, slot, year_group, skill.id, assigned_teacher_id)
+    if deduped_cells:
+        BAC_LOG.warning("step=sessions.grid.save.deduped_cells count=%s day=%s slot=%s year_group=%s", deduped_cells, day, slot, year_group)
 
     db.session.commit()
-    BAC_LOG.info("step=sessions.grid.save.success session_id=%s", session.id)
+    BAC_LOG.info("step=sessions.grid.save.success session_id=%s", session_id)
     flash("Session cell saved.", "success")
-    return redirect(url_for("index", active_day=active_day))
+    return redirect(index_url(active_day))
 
 
 @app.post("/sessions/grid/clear")
@@ -938,41 +1327,62 @@ def clear_grid_session():
 
     BAC_LOG.info("step=sessions.grid.clear.request day=%r slot=%r year_group=%r", day, slot, year_group)
 
-    sessions = Session.query.filter_by(day=day, slot=slot, year_group=year_group).all()
-    if not sessions:
+    removed = Session.query.filter_by(day=day, slot=slot, year_group=year_group).delete(synchronize_session=False)
+    if not removed:
         BAC_LOG.warning("step=sessions.grid.clear.skipped reason=not_found")
         flash("No session found for this cell.", "error")
-        return redirect(url_for("index", active_day=active_day))
+        return redirect(index_url(active_day))
 
-    for session in sessions:
-        db.session.delete(session)
     db.session.commit()
-    BAC_LOG.info("step=sessions.grid.clear.success removed=%s", len(sessions))
+    BAC_LOG.info("step=sessions.grid.clear.success removed=%s", removed)
     flash("Session cell cleared.", "success")
-    return redirect(url_for("index", active_day=active_day))
+    return redirect(index_url(active_day))
 
 
 @app.post("/allocate")
 def run_allocation():
     BAC_LOG.info("step=allocate.request")
-    if grid_sessions_query().count() == 0:
+    if not db.session.scalar(select(grid_sessions_select().exists())):
         BAC_LOG.warning("step=allocate.skipped reason=no_sessions")
         flash("No sessions to allocate.", "error")
-        return redirect(url_for("index"))
+        return redirect(index_url())
 
     allocate_sessions()
     BAC_LOG.info("step=allocate.success")
     flash("Allocation completed.", "success")
-    return redirect(url_for("index"))
+    return redirect(index_url())
+
+
+def read_bootstrap_stamp() -> int | None:
+    # The stamp lives in PRAGMA user_version so it travels with the database file itself.
+    if db.engine.url.get_backend_name() != "sqlite":
+        return None
+    with db.engine.connect().execution_options(sqlite_read_only=True) as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def write_bootstrap_stamp() -> None:
+    if db.engine.url.get_backend_name() != "sqlite":
+        return
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version={int(BOOTSTRAP_SCHEMA_REV)}")
+    BAC_LOG.info("step=bootstrap.stamp_written schema_rev=%s", BOOTSTRAP_SCHEMA_REV)
 
 
 def initialize_database() -> None:
     with app.app_context():
         run_bootstrap_step("create_all", db.create_all)
-        run_bootstrap_step("ensure_session_grid_columns", ensure_session_grid_columns)
-        run_bootstrap_step("migrate_legacy_year_groups", migrate_legacy_year_groups)
-        run_bootstrap_step("deduplicate_grid_sessions", deduplicate_grid_sessions)
-        run_bootstrap_step("ensure_grid_indexes", ensure_grid_indexes)
+        if read_bootstrap_stamp() == BOOTSTRAP_SCHEMA_REV:
+            BAC_LOG.info("step=bootstrap.steps_skipped reason=stamp_current schema_rev=%s", BOOTSTRAP_SCHEMA_REV)
+        else:
+            steps_ok = [
+                run_bootstrap_step("ensure_session_grid_columns", ensure_session_grid_columns),
+                run_bootstrap_step("migrate_legacy_year_groups", migrate_legacy_year_groups),
+                run_bootstrap_step("deduplicate_grid_sessions", deduplicate_grid_sessions),
+                run_bootstrap_step("ensure_grid_indexes", ensure_grid_indexes),
+            ]
+            if all(steps_ok):
+                write_bootstrap_stamp()
         BAC_LOG.info("step=bootstrap.db_ready uri=%s", app.config["SQLALCHEMY_DATABASE_URI"])
 
 
@@ -987,5 +1397,13 @@ if __name__ == "__main__":
         initialize_database()
     else:
         BAC_LOG.info("step=bootstrap.skip reason=debug_reloader_parent")
-    BAC_LOG.info("step=server.start host=%s port=%s debug=%s use_reloader=%s", host, port, debug, False)
-    app.run(host=host, port=port, debug=debug, use_reloader=False)
+    if debug or os.getenv("USE_DEV_SERVER") == "1":
+        BAC_LOG.info("step=server.start server=werkzeug host=%s port=%s debug=%s use_reloader=%s", host, port, debug, False)
+        app.run(host=host, port=port, debug=debug, use_reloader=False)
+    else:
+        # waitress serves many threads from this one process, which keeps the app lock and the
+        # in-process page/teacher caches valid (a multi-process server would break both).
+        from waitress import serve
+
+        BAC_LOG.info("step=server.start server=waitress host=%s port=%s threads=%s", host, port, WSGI_THREADS)
+        serve(app, host=host, port=port, threads=WSGI_THREADS)